@@ -5,11 +5,14 @@ weather_cli_rich.py — Terminal UI using rich: colorful table + hourly sparklin
 Usage:
   python weather_cli_rich.py [City]
 Deps:
-  pip install requests rich
+  pip install requests rich numpy
 """
 
-import sys, os, json, time
-from datetime import datetime, timezone
+import sys, os, json, time, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from importlib.util import find_spec
+from urllib.parse import quote
 try:
     import requests
 except ImportError:
@@ -17,61 +20,206 @@ except ImportError:
     raise SystemExit(1)
 
 try:
-    from rich.console import Console
-    from rich.table import Table
-    from rich.panel import Panel
-    from rich.align import Align
-    from rich.text import Text
+    import numpy as np
+except ImportError:
+    print("Install numpy: pip install numpy")
+    raise SystemExit(1)
+
+try:
+    import orjson
+    json_loads, json_dumps = orjson.loads, orjson.dumps
+except ImportError:
+    # stdlib fallback; keep the bytes-in/bytes-out contract of orjson
+    json_loads = json.loads
+    def json_dumps(obj): return json.dumps(obj).encode("utf-8")
+
+try:
+    from requests_cache import CachedSession
 except ImportError:
+    CachedSession = None
+
+# rich itself is imported lazily (see get_console); it pulls in many modules,
+# so main() lets that import overlap with the first network request
+if find_spec("rich") is None:
     print("Install rich: pip install rich")
     raise SystemExit(1)
 
 # ---------- CONFIG ----------
-import os
 OPENWEATHER_KEY = os.environ.get("OPENWEATHER_KEY", "").strip()
 USE_OWM = bool(OPENWEATHER_KEY)
+# opt-in: importing numba costs far more than it saves on a 36-point chart
+USE_NUMBA = os.environ.get("WEATHER_NUMBA", "").strip() == "1"
 CFG_PATH = os.path.expanduser("~/.weather_cfg.json")
+CACHE_PATH = os.path.expanduser("~/.weather_cache.sqlite")
 DEFAULT_CITY = "London"
+DAY_FMT = "%a %d %b"  # forecast row label
 
-console = Console()
+# OWM URL templates with the key and units baked in at load time, so a fetch
+# is a single "%" format over lat/lon (literal "%" in the fixed parts is escaped)
+_OWM_DATA = "https://api.openweathermap.org/data/2.5/"
+_OWM_KEY = "&appid=" + OPENWEATHER_KEY.replace("%", "%%")
+_GEO_TMPL = "https://api.openweathermap.org/geo/1.0/direct?q=%s&limit=1" + _OWM_KEY
+
+def _owm_templates(units):
+    q = "?lat=%s&lon=%s&units=" + units.replace("%", "%%")
+    return {
+        "onecall": _OWM_DATA + "onecall" + q + "&exclude=minutely,alerts" + _OWM_KEY,
+        "weather": _OWM_DATA + "weather" + q + _OWM_KEY,
+        "forecast": _OWM_DATA + "forecast" + q + _OWM_KEY,
+    }
+
+_TMPL_CACHE = {u: _owm_templates(u) for u in ("metric", "imperial")}
+
+def owm_tmpl(units):
+    tmpl = _TMPL_CACHE.get(units)
+    if tmpl is None:
+        tmpl = _TMPL_CACHE[units] = _owm_templates(units)
+    return tmpl
+
+# shared pool for issuing independent HTTP requests concurrently
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+def run_in_background(fn, *args):
+    """Run fn(*args) on a daemon thread and return a Future for its result.
+
+    For work started before the prompt: unlike _EXECUTOR, whose workers are
+    joined at exit, a call still in flight never keeps the process alive
+    after the user quits.
+    """
+    fut = Future()
+    def run():
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return fut
+
+# one keep-alive session for every fetcher, so repeated calls to the same
+# host reuse the TCP/TLS connection instead of handshaking again.
+# With requests-cache installed, responses are also cached on disk:
+# geocoding for a week, forecasts for an hour, everything else 10 min.
+if CachedSession is not None:
+    SESSION = CachedSession(
+        CACHE_PATH, backend="sqlite", expire_after=600,
+        urls_expire_after={"*geo/1.0/direct*": 86400*7, "*/data/2.5/forecast*": 3600},
+        ignored_parameters=["appid"])  # keep the API key out of the cache
+else:
+    SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+SESSION.mount("https://", _adapter); SESSION.mount("http://", _adapter)
+SESSION.headers.update({"Accept-Encoding": "gzip", "Connection": "keep-alive"})
+
+console = None
+
+def get_console():
+    global console
+    if console is None:
+        from rich.console import Console
+        console = Console()
+    return console
 
 # ---------- helpers ----------
 def load_cfg():
     try:
-        return json.load(open(CFG_PATH, "r"))
+        return json_loads(open(CFG_PATH, "rb").read())
     except Exception:
         return {}
 
 def save_cfg(cfg):
     try:
-        json.dump(cfg, open(CFG_PATH, "w"))
+        new = json_dumps(cfg)
+        # follow a symlinked config (dotfile managers) so the real file is updated
+        target = os.path.realpath(CFG_PATH)
+        try:
+            with open(target, "rb") as f:
+                if f.read() == new: return  # unchanged: skip the write
+        except OSError:
+            pass
+        # write a temp file and swap it in, so a crash never leaves half a config
+        tmp = target + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(new)
+            os.replace(tmp, target)
+        except Exception:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
     except Exception:
         pass
 
+# shared read-only defaults for nested lookups, so per-row code doesn't
+# allocate a fresh {} / [{}] on every .get(); for lookups only, never put
+# them into returned data
+_EMPTY = {}
+_EMPTY_W = ({},)
+
 def cap(s): return s.capitalize() if isinstance(s, str) else s
 def human_time(ts, tz_offset=0):
     return datetime.fromtimestamp((ts or int(time.time())) + (tz_offset or 0), tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
 
 # sparkline with unicode blocks (same idea)
-SPARK = "▁▂▃▄▅▆▇█"
+# every glyph is 3 bytes in UTF-8, so a fixed-width S3 table lets the whole
+# line be gathered with one fancy-index and decoded once
+SPARK_BYTES = np.array([c.encode("utf-8") for c in "▁▂▃▄▅▆▇█"], dtype="S3")
+
+def _spark_indices(a, width, nlevels):
+    """Resample `a` to `width` points and map each onto 0..nlevels-1."""
+    a = np.interp(np.linspace(0, len(a)-1, width), np.arange(len(a)), a)
+    # two C reductions over `width` floats beat a Python single-pass loop;
+    # the optional numba kernel below does fuse lo/hi into one pass
+    lo = a.min(); hi = a.max()
+    if hi == lo: return np.zeros(width, dtype=np.uint8)
+    # divide before scaling so v == hi maps to exactly nlevels-1
+    return ((a - lo) / (hi - lo) * (nlevels-1)).astype(np.uint8)
+
+def _spark_kernel(a, width, nlevels):
+    # fused kernel: resample and track lo/hi in one pass, scale in a second
+    n = a.shape[0]
+    res = np.empty(width, np.float64)
+    step = (n - 1) / (width - 1) if width > 1 else 0.0
+    lo = np.inf; hi = -np.inf
+    for i in range(width):
+        x = i * step
+        j = int(x)
+        v = a[n-1] if j >= n - 1 else a[j] + (a[j+1] - a[j]) * (x - j)
+        res[i] = v
+        lo = min(lo, v); hi = max(hi, v)
+    out = np.zeros(width, np.uint8)
+    if hi > lo:
+        span = hi - lo
+        for i in range(width):
+            # divide first, as in the NumPy path, so hi maps to nlevels-1
+            out[i] = int((res[i] - lo) / span * (nlevels - 1))
+    return out
+
+def load_spark_kernel():
+    """Swap a numba build of _spark_kernel in for _spark_indices (if installed).
+
+    Meant to run via run_in_background, keeping the numba import and JIT/cache
+    load off the main thread; sparkline uses the NumPy path until the swap lands.
+    """
+    global _spark_indices
+    try:
+        from numba import njit
+    except ImportError:
+        return
+    kernel = njit(cache=True)(_spark_kernel)
+    kernel(np.zeros(2), 2, len(SPARK_BYTES))  # compile, or load from cache
+    _spark_indices = kernel
+
 def sparkline(values, width=30):
     if not values: return ""
-    if len(values) > width:
-        step = len(values)/width
-        vals = [values[int(i*step)] for i in range(width)]
-    else:
-        vals = values + [values[-1]]*(width-len(values))
-    lo = min(vals); hi = max(vals)
-    if hi==lo: return "".join(SPARK[0] for _ in vals)
-    out = "".join(SPARK[int((v-lo)/(hi-lo)*(len(SPARK)-1))] for v in vals)
-    return out
+    idx = _spark_indices(np.asarray(values, dtype=np.float64), width, len(SPARK_BYTES))
+    return SPARK_BYTES[idx].tobytes().decode("utf-8")
 
 # fetchers
 def geocode_owm(city):
-    url = f"https://api.openweathermap.org/geo/1.0/direct?q={requests.utils.requote_uri(city)}&limit=1&appid={OPENWEATHER_KEY}"
-    r = requests.get(url, timeout=8)
+    url = _GEO_TMPL % quote(city, safe="")
+    r = SESSION.get(url, timeout=8)
     r.raise_for_status()
-    j = r.json()
+    j = json_loads(r.content)
     if not j:
         raise ValueError("City not found")
     it = j[0]
@@ -83,15 +231,16 @@ def fetch_onecall(lat, lon, units="metric"):
     Try One Call. If it fails (401 or other), fall back to /weather + /forecast.
     Returns a dict compatible with the rest of the script: keys: current, hourly, daily, timezone_offset
     """
-    base_one = ("https://api.openweathermap.org/data/2.5/onecall"
-                f"?lat={lat}&lon={lon}&units={units}&exclude=minutely,alerts&appid={OPENWEATHER_KEY}")
+    base_one = owm_tmpl(units)["onecall"] % (lat, lon)
     try:
-        r = requests.get(base_one, timeout=10)
+        r = SESSION.get(base_one, timeout=10)
         if r.status_code == 200:
-            return r.json()
+            return json_loads(r.content)
         else:
             return fetch_weather_and_forecast(lat, lon, units)
-    except requests.RequestException:
+    except (requests.RequestException, ValueError):
+        # ValueError: a 200 with a non-JSON body (stdlib and orjson decode
+        # errors both subclass it; r.json() used to raise a RequestException)
         return fetch_weather_and_forecast(lat, lon, units)
 
 def fetch_weather_and_forecast(lat, lon, units="metric"):
@@ -99,56 +248,53 @@ def fetch_weather_and_forecast(lat, lon, units="metric"):
     Use /weather (current) and /forecast (3-hourly) to build a OneCall-like payload.
     """
     # current
-    cur_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units={units}&appid={OPENWEATHER_KEY}"
-    fr_url  = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&units={units}&appid={OPENWEATHER_KEY}"
-    rcur = requests.get(cur_url, timeout=8); rcur.raise_for_status(); cur = rcur.json()
-    rfr  = requests.get(fr_url, timeout=10);  rfr.raise_for_status(); fr = rfr.json()
+    tmpl = owm_tmpl(units)
+    cur_url = tmpl["weather"] % (lat, lon)
+    fr_url  = tmpl["forecast"] % (lat, lon)
+    # fire both requests at once: latency is max(t1, t2) instead of t1 + t2
+    f1 = _EXECUTOR.submit(SESSION.get, cur_url, timeout=8)
+    f2 = _EXECUTOR.submit(SESSION.get, fr_url, timeout=10)
+    rcur = f1.result(); rcur.raise_for_status(); cur = json_loads(rcur.content)
+    rfr  = f2.result(); rfr.raise_for_status(); fr = json_loads(rfr.content)
 
-    # build hourly: take up to next 24 3-hour entries and repeat to approximate hourly resolution
+    # build hourly: the next 24h is 8 of the 3-hour entries; keep them as-is
+    # (sparkline interpolates short series, so there is no need to pad)
     fr_list = fr.get("list", [])  # 3-hour steps
     hourly = []
     for item in fr_list:
         hourly.append({
             "dt": item.get("dt"),
-            "temp": item.get("main", {}).get("temp"),
+            "temp": (item.get("main") or _EMPTY).get("temp"),
             "weather": item.get("weather", [])
         })
-        if len(hourly) >= 24:
+        if len(hourly) >= 8:
             break
-    if hourly and len(hourly) < 24:
-        last = hourly[-1]
-        while len(hourly) < 24:
-            hourly.append(last)
-
-    # build daily: aggregate by calendar day (min/max + representative weather)
-    from datetime import datetime as _dt, timezone as _tz
-    daily_map = {}
-    for item in fr_list:
-        dt = item.get("dt")
-        # convert to timezone-aware UTC date
-        day = _dt.fromtimestamp(dt, tz=_tz.utc).date()
-        t = item.get("main", {})
-        w = item.get("weather", [{}])[0]
-        entry = daily_map.setdefault(day, {"temps": [], "weathers": [], "dts": []})
-        entry["temps"].append((t.get("temp_min"), t.get("temp_max")))
-        entry["weathers"].append(w)
-        entry["dts"].append(dt)
 
+    # build daily: aggregate by calendar day (UTC) as parallel arrays, so the
+    # per-day min/max are single reduceat calls rather than Python loops
     daily = []
-    for day in sorted(daily_map.keys()):
-        group = daily_map[day]
-        mins = [a for a,b in group["temps"] if a is not None]
-        maxs = [b for a,b in group["temps"] if b is not None]
-        tmin = min(mins) if mins else None
-        tmax = max(maxs) if maxs else None
-        mid_idx = len(group["weathers"]) // 2
-        w = group["weathers"][mid_idx] if group["weathers"] else {}
-        dt_val = group["dts"][mid_idx] if group["dts"] else int(time.time())
-        daily.append({
-            "dt": dt_val,
-            "temp": {"min": tmin, "max": tmax},
-            "weather": [w]
-        })
+    if fr_list:
+        dts = np.array([item.get("dt") for item in fr_list], dtype=np.int64)
+        # missing temps become NaN, which fmin/fmax skip
+        tmins = np.array([(item.get("main") or _EMPTY).get("temp_min") for item in fr_list], dtype=np.float64)
+        tmaxs = np.array([(item.get("main") or _EMPTY).get("temp_max") for item in fr_list], dtype=np.float64)
+        # these end up in the returned payload, so a missing entry gets its own
+        # {} (the `or` only allocates when it is actually missing)
+        weathers = [(item.get("weather") or [{}])[0] for item in fr_list]
+        days = dts // 86400
+        order = np.argsort(days, kind="stable")  # groups must be contiguous for reduceat
+        _, starts, counts = np.unique(days[order], return_index=True, return_counts=True)
+        mins = np.fmin.reduceat(tmins[order], starts)
+        maxs = np.fmax.reduceat(tmaxs[order], starts)
+        for start, n, tmin, tmax in zip(starts.tolist(), counts.tolist(), mins.tolist(), maxs.tolist()):
+            # representative entry: the middle one of the day
+            k = int(order[start + n // 2])
+            daily.append({
+                "dt": int(dts[k]),
+                "temp": {"min": None if np.isnan(tmin) else tmin,
+                         "max": None if np.isnan(tmax) else tmax},
+                "weather": [weathers[k]]
+            })
 
     # Construct a OneCall-like dict
     owm_like = {
@@ -167,23 +313,28 @@ def fetch_weather_and_forecast(lat, lon, units="metric"):
     return owm_like
 
 def fetch_wttr_city(city):
-    r = requests.get(f"https://wttr.in/{requests.utils.requote_uri(city)}?format=j1", timeout=10)
+    r = SESSION.get(f"https://wttr.in/{quote(city, safe=',')}?format=j1", timeout=10)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
 # ---------- render ----------
 ICON = {"Thunderstorm":"⛈️","Drizzle":"🌦️","Rain":"🌧️","Snow":"❄️","Clear":"☀️","Clouds":"☁️","Mist":"🌫️","Haze":"🌫️"}
 
 def render_rich_owm(data, place_label, units):
+    from rich.console import Group
+    from rich.table import Table
+    from rich.panel import Panel
+    from rich.text import Text
+    console = get_console()
     cur = data.get("current",{}); daily = data.get("daily",[]); hourly=data.get("hourly",[])
-    tz_offset = data.get("timezone_offset",0)
+    tz_offset = data.get("timezone_offset",0) or 0
     unit_sym = "°C" if units=="metric" else "°F"
     w = cur.get("weather",[{}])[0]; desc = w.get("description",""); main=w.get("main","")
     icon = ICON.get(main,"")
     temps24 = [h.get("temp") for h in hourly[:24] if h.get("temp") is not None]
 
     head = Text(f"{place_label}  ", style="bold cyan") + Text(f"{human_time(cur.get('dt',int(time.time())),tz_offset)}", style="dim")
-    console.print(Panel(head, style="white on #071725"))
+    panel = Panel(head, style="white on #071725")
 
     left = Table(show_header=False, box=None)
     left.add_row("Condition", f"{icon} {cap(desc)}")
@@ -199,40 +350,48 @@ def render_rich_owm(data, place_label, units):
 
     right = Table(show_header=False, box=None)
     right.add_row("3-day forecast", "")
+    fromts = datetime.fromtimestamp; utc = timezone.utc
     for i in range(1,4):
         if i>=len(daily): break
         d = daily[i]
-        ddate = datetime.fromtimestamp(d["dt"] + (tz_offset or 0), tz=timezone.utc).strftime("%a %d %b")
-        desc = d.get("weather",[{}])[0].get("description","")
-        tmax = round(d.get("temp",{}).get("max",0)) if d.get("temp",{}).get("max") is not None else 0
-        tmin = round(d.get("temp",{}).get("min",0)) if d.get("temp",{}).get("min") is not None else 0
+        ddate = fromts(d["dt"] + tz_offset, tz=utc).strftime(DAY_FMT)
+        desc = (d.get("weather") or _EMPTY_W)[0].get("description","")
+        temp = d.get("temp") or _EMPTY
+        tmax = round(temp.get("max") or 0); tmin = round(temp.get("min") or 0)
         right.add_row(f"[bold]{ddate}[/bold]", f"{cap(desc):18} {tmax}{unit_sym}/{tmin}{unit_sym}")
 
     grid = Table.grid(expand=True)
     grid.add_column(ratio=2); grid.add_column(ratio=3)
     grid.add_row(left, right)
-    console.print(grid)
+    # one print for the whole frame, so it renders and flushes in one go
+    console.print(Group(panel, grid))
 
 def render_rich_wttr(data, place_label, units):
+    from rich.console import Group
+    from rich.table import Table
+    from rich.panel import Panel
+    from rich.text import Text
+    console = get_console()
     cur = data.get("current_condition",[{}])[0]; days = data.get("weather",[])
     unit_sym = "°C" if units=="metric" else "°F"
     temp = cur.get("temp_C") if units=="metric" else cur.get("temp_F")
     feels = cur.get("FeelsLikeC") if units=="metric" else cur.get("FeelsLikeF")
     head = Text(f"{place_label}  ", style="bold green") + Text(datetime.now().strftime("%Y-%m-%d %H:%M"), style="dim")
-    console.print(Panel(head))
+    panel = Panel(head)
     t = Table(box=None)
     t.add_row("Condition", cap((cur.get("weatherDesc") or [{}])[0].get("value","")))
     t.add_row("Temp", f"{temp}{unit_sym} (feels {feels}{unit_sym})")
     t.add_row("Humidity", f"{cur.get('humidity','—')}%")
-    console.print(t)
     f = Table(title="3-day forecast")
     f.add_column("Day"); f.add_column("High/Low")
     for d in days[1:4]:
-        dt = datetime.strptime(d["date"], "%Y-%m-%d").strftime("%a %d %b")
+        # "YYYY-MM-DD": split it instead of going through strptime's regex
+        y, m, dd = map(int, d["date"].split("-"))
+        dt = date(y, m, dd).strftime(DAY_FMT)
         tmax = d.get("maxtempC") if units=="metric" else d.get("maxtempF")
         tmin = d.get("mintempC") if units=="metric" else d.get("mintempF")
         f.add_row(dt, f"{tmax}{unit_sym}/{tmin}{unit_sym}")
-    console.print(f)
+    console.print(Group(panel, t, f))
 
 # ---------- main ----------
 def main():
@@ -244,8 +403,24 @@ def main():
     else:
         city = last_city; place_label = city
 
+    # start the first request now, so it overlaps with importing rich and
+    # with the user answering the prompt (wttr's j1 carries both unit systems)
+    if USE_OWM and city:
+        pending = run_in_background(geocode_owm, city)
+    else:
+        pending = run_in_background(fetch_wttr_city, city)
+
+    if USE_NUMBA:
+        # import numba and load the kernel in the background while we wait on
+        # I/O; a daemon thread, so a cold-cache compile never delays exit
+        run_in_background(load_spark_kernel)
+
+    console = get_console()
     console.print("\n[u] toggle units   [Enter] continue   [q] quit", style="dim")
-    c = input("Choice: ").strip().lower()
+    try:
+        c = input("Choice: ").strip().lower()
+    except (KeyboardInterrupt, EOFError):
+        print(); return  # quit right away; the prefetch thread is a daemon
     if c == "u":
         units = "imperial" if units=="metric" else "metric"
         console.print(f"Units now: {'°F' if units=='imperial' else '°C'}")
@@ -254,12 +429,12 @@ def main():
 
     try:
         if USE_OWM and city:
-            lat, lon, name, country = geocode_owm(city)
+            lat, lon, name, country = pending.result()
             place_label = f"{name}, {country}" if country else name
             data = fetch_onecall(lat, lon, units=units)
             render_rich_owm(data, place_label, units)
         else:
-            data = fetch_wttr_city(city)
+            data = pending.result()
             render_rich_wttr(data, place_label, units)
     except requests.HTTPError as e:
         console.print("Network/API error: " + str(e), style="red")